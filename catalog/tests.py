@@ -1,3 +1,80 @@
-from django.test import TestCase
+from itertools import permutations
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .utils import (
+    categories, categorize_product, normalizar_texto, normalize_color, normalize_size,
+)
+
+
+class NormalizeColorTests(SimpleTestCase):
+    """Debe reproducir el CASE/UPPER/LOWER que antes se hacía en el SQL"""
+
+    def test_sin_color(self):
+        for raw in (None, '', '   '):
+            self.assertEqual(normalize_color(raw), 'Sin color')
+
+    def test_guiones_y_mayusculas(self):
+        self.assertEqual(normalize_color('azul-marino'), 'Azul marino')
+        self.assertEqual(normalize_color('NEGRO'), 'Negro')
+        self.assertEqual(normalize_color('verde-OLIVA-claro'), 'Verde oliva claro')
+
+    def test_guion_inicial(self):
+        # En SQL la primera letra era el espacio: el resto queda en minúsculas
+        self.assertEqual(normalize_color('-rojo'), 'rojo')
+
+
+class NormalizeSizeTests(SimpleTestCase):
+    """Debe reproducir el CASE/UPPER/SUBSTRING_INDEX(-1) que antes se hacía en el SQL"""
+
+    def test_talla_unica(self):
+        for raw in (None, '', '   '):
+            self.assertEqual(normalize_size(raw), 'Única')
+
+    def test_ultimo_segmento(self):
+        self.assertEqual(normalize_size('talla-xl'), 'XL')
+        self.assertEqual(normalize_size('s-m-l'), 'L')
+        self.assertEqual(normalize_size('m'), 'M')
+        self.assertEqual(normalize_size(' m '), 'M')
+
+    def test_guion_final(self):
+        self.assertEqual(normalize_size('xl-'), '')
+
+
+def _categorize_reference(name):
+    """Versión directa: primera categoría (en orden de declaración) con todas sus keywords"""
+    name_normalizado = normalizar_texto(name.lower())
+    for category, keywords in categories.items():
+        if all(normalizar_texto(k.lower()) in name_normalizado for k in keywords):
+            return category
+    return "Sin categoría"
+
+
+class CategorizeProductTests(SimpleTestCase):
+    """El regex combinado debe respetar el orden de declaración de `categories`"""
+
+    def test_empate_gana_la_primera_declarada(self):
+        # Cumple "Hoodie Oversize" y "Hoodie Oversize con Cierre": gana la primera
+        self.assertEqual(categorize_product("Hoodie Oversize Fit con Cierre"), "Hoodie Oversize")
+        self.assertEqual(categorize_product("Hoodie Oversize con Cierre"), "Hoodie Oversize con Cierre")
+        self.assertEqual(categorize_product("Camiseta Oversize Boxy Fit Premium"), "Camiseta Oversize")
+
+    def test_keywords_en_cualquier_orden(self):
+        self.assertEqual(
+            categorize_product("Premium Fit Boxy Camiseta Negra"),
+            "Camiseta Estampado Boxy Fit Premium",
+        )
+
+    def test_tildes_y_mayusculas(self):
+        self.assertEqual(categorize_product("Pantalón Cargo Beige"), "Pantalones")
+        self.assertEqual(categorize_product("CAMISETA BOXY POLO"), "Camiseta Boxy Polo")
+
+    def test_sin_categoria(self):
+        self.assertEqual(categorize_product("Gorra Trucker"), "Sin categoría")
+        self.assertEqual(categorize_product(""), "Sin categoría")
+
+    def test_coincide_con_referencia(self):
+        keywords = sorted({k for kws in categories.values() for k in kws})
+        for combo in permutations(keywords, 3):
+            name = " ".join(combo)
+            self.assertEqual(categorize_product(name), _categorize_reference(name), name)
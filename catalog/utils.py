@@ -3,10 +3,12 @@ from functools import lru_cache
 import unicodedata
 import re
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PIL import Image
 from io import BytesIO
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Product:
     sku: str
     name: str
@@ -16,14 +18,36 @@ class Product:
     thumbnail_url: str
     stock_loc_294: str
     stock_loc_295: str
+    category: str
 
     def __str__(self):
         return f"{self.name} - {self.size}"
 
 def normalizar_texto(texto):
     """Quita tildes y diacríticos del texto"""
+    # Quick check: el texto ASCII no tiene diacríticos, se evita la descomposición NFD
+    if texto.isascii():
+        return texto
     return unicodedata.normalize('NFD', texto).encode('ascii', 'ignore').decode('ascii')
 
+@lru_cache(maxsize=None)
+def normalize_color(color_raw):
+    """
+    Normaliza el color crudo de WooCommerce ('azul-marino' -> 'Azul marino').
+    Se hace en Python al cargar el cache en lugar de en cada fila del SQL.
+    """
+    if color_raw is None or not color_raw.strip():
+        return 'Sin color'
+    color = color_raw.replace('-', ' ')
+    return (color[:1].upper() + color[1:].lower()).strip()
+
+@lru_cache(maxsize=None)
+def normalize_size(talla_raw):
+    """Normaliza la talla cruda de WooCommerce ('talla-xl' -> 'XL')"""
+    if talla_raw is None or not talla_raw.strip():
+        return 'Única'
+    return talla_raw.rsplit('-', 1)[-1].upper().strip()
+
 # Diccionario original (mantener para compatibilidad con imports existentes)
 categories = {
     "Camiseta Oversize": ["Camiseta", "Oversize"],
@@ -41,16 +65,42 @@ categories = {
 
 # Pre-normalizar las keywords una sola vez
 def _normalize_categories(categories_dict):
-    """Pre-normaliza todas las keywords para evitar repetir el proceso"""
+    """
+    Pre-normaliza todas las keywords para evitar repetir el proceso.
+    Se ordenan de mayor a menor longitud: las más largas son las menos
+    probables, así la comprobación de cada categoría falla antes.
+    """
     normalized = {}
     for category, keywords in categories_dict.items():
-        normalized[category] = [normalizar_texto(keyword.lower()) for keyword in keywords]
+        normalized[category] = sorted(
+            (normalizar_texto(keyword.lower()) for keyword in keywords),
+            key=len,
+            reverse=True,
+        )
     return normalized
 
 # Keywords pre-normalizadas (se ejecuta solo una vez)
 categories_normalized = _normalize_categories(categories)
 
-@lru_cache(maxsize=1024)
+def _compile_category_pattern(categories_dict):
+    """
+    Compila todas las categorías en un solo regex: una alternativa por
+    categoría (en orden) con un lookahead por keyword, así un único
+    match identifica la categoría.
+    """
+    group_to_category = {}
+    alternatives = []
+    for i, (category, keywords) in enumerate(categories_dict.items()):
+        group = f"cat{i}"
+        group_to_category[group] = category
+        lookaheads = ''.join(f"(?=.*{re.escape(keyword)})" for keyword in keywords)
+        alternatives.append(f"(?P<{group}>{lookaheads})")
+    pattern = re.compile('|'.join(alternatives), re.ASCII | re.DOTALL)
+    return pattern, group_to_category
+
+_category_pattern, _group_to_category = _compile_category_pattern(categories_normalized)
+
+@lru_cache(maxsize=None)
 def categorize_product(name):
     """
     Categoriza un producto basándose en su nombre,
@@ -58,10 +108,9 @@ def categorize_product(name):
     Resultados cacheados con lru_cache para evitar recálculos.
     """
     name_normalizado = normalizar_texto(name.lower())
-
-    for category, keywords_normalizados in categories_normalized.items():
-        if all(keyword in name_normalizado for keyword in keywords_normalizados):
-            return category
+    match = _category_pattern.match(name_normalizado)
+    if match:
+        return _group_to_category[match.lastgroup]
 
     return "Sin categoría"
 
@@ -87,21 +136,52 @@ def get_wordpress_optimized_url(original_url):
     optimized_url = f"{base_url}-1070x1536.{extension}"
     return optimized_url
 
-def download_image(url):
+# Conexiones simultáneas por host: igual al número de hilos de descarga
+IMAGE_POOL_SIZE = 32
+
+# Sesión HTTP compartida: reutiliza conexiones keep-alive (y TLS) hacia WordPress
+SESSION = requests.Session()
+# Un reintento inmediato si falla la conexión; las lecturas no se reintentan
+# para no pagar dos veces el timeout de lectura
+_adapter = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=IMAGE_POOL_SIZE,
+    max_retries=Retry(connect=1, read=0, backoff_factor=0),
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+SESSION.headers.update({'User-Agent': 'DUDS-Catalogo/1.0'})
+
+# Imagen por defecto compartida (solo se lee al dibujar, no se modifica)
+DEFAULT_IMAGE = Image.new('RGB', (1070, 1536), 'white')
+
+# (conexión, lectura): falla rápido si el host de WordPress no responde
+IMAGE_TIMEOUT = (2, 5)
+
+def download_image(url, session=None):
     """
-    Descarga una imagen usando la versión optimizada de WordPress (1070x1536)
+    Descarga una imagen usando la versión optimizada de WordPress (1070x1536).
+    Si la optimizada falla recurre a la URL original, salvo por timeout:
+    si el host no responde, no se paga un segundo timeout.
+    Usa la sesión compartida SESSION si no se indica otra.
     """
-    urls_to_try = [get_wordpress_optimized_url(url), url]
+    session = session or SESSION
+    optimized_url = get_wordpress_optimized_url(url)
+    urls_to_try = [optimized_url] if optimized_url == url else [optimized_url, url]
 
     for attempt_url in urls_to_try:
         try:
-            response = requests.get(attempt_url, timeout=10)
+            response = session.get(attempt_url, timeout=IMAGE_TIMEOUT)
             response.raise_for_status()
             return Image.open(BytesIO(response.content))
+        except requests.exceptions.Timeout:
+            # Incluye ConnectTimeout; otros errores de conexión (p. ej. un
+            # reset momentáneo) sí prueban la URL original
+            break
         except requests.exceptions.RequestException:
             continue
         except Exception:
             continue
 
     # Si todas las URLs fallan, devolver imagen por defecto
-    return Image.new('RGB', (1070, 1536), 'white')
+    return DEFAULT_IMAGE
@@ -1,7 +1,10 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.contrib.auth.decorators import login_required
-from .utils import Product, categorize_product, download_image
+from .utils import (
+    DEFAULT_IMAGE, IMAGE_POOL_SIZE, SESSION, Product, categorize_product, download_image,
+    normalize_color, normalize_size,
+)
 from io import BytesIO
 import os
 from reportlab.pdfgen import canvas
@@ -10,23 +13,66 @@ from reportlab.lib.units import inch
 from reportlab.lib.utils import ImageReader
 import textwrap
 from reportlab.lib.colors import black
-from urllib.parse import unquote
+from PIL import Image
+from urllib.parse import quote, unquote, urlencode
 from django.db import connections
+from pymysql.cursors import SSCursor
 from django.utils import timezone
 from django.contrib.auth import logout
 from django.core.cache import cache
+from django.core.signing import BadSignature, TimestampSigner
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+import hashlib
 import uuid
 import tempfile
+import threading
+import time
 
 PRODUCTS_CACHE_KEY = 'wordpress_products'
 PRODUCTS_CACHE_TIMESTAMP_KEY = 'wordpress_products_timestamp'
+PRODUCTS_CACHE_TOTALS_KEY = 'wordpress_products_category_totals'
 PRODUCTS_CACHE_TTL = 300  # 5 minutos
 
 PDF_TEMP_DIR = os.path.join(tempfile.gettempdir(), 'duds_pdfs')
 os.makedirs(PDF_TEMP_DIR, exist_ok=True)
 
 
+def _pdf_temp_path(pdf_id):
+    """Ruta del PDF temporal asociado a un id"""
+    return os.path.join(PDF_TEMP_DIR, f"{pdf_id}.pdf")
+
+
+# Enlaces de descarga firmados: válidos por 10 minutos
+PDF_LINK_MAX_AGE = 600
+_pdf_signer = TimestampSigner(salt='catalog.download_pdf')
+
+
+def _purge_expired_pdfs():
+    """
+    Borra PDFs temporales que nunca se descargaron: el enlace se firma antes
+    de escribir el archivo, así pasado PDF_LINK_MAX_AGE desde su mtime el
+    enlace ya no es válido
+    """
+    cutoff = time.time() - PDF_LINK_MAX_AGE
+    try:
+        with os.scandir(PDF_TEMP_DIR) as it:
+            for entry in it:
+                if not entry.name.endswith('.pdf'):
+                    continue
+                # Una descarga concurrente puede borrar el archivo entre
+                # scandir y stat/remove: la purga es best-effort
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+    except FileNotFoundError:
+        # El directorio fue borrado (limpieza de /tmp): se recrea para esta petición
+        os.makedirs(PDF_TEMP_DIR, exist_ok=True)
+
+
 def fetch_wordpress_products():
     """
     Versión optimizada específica para MariaDB 10.6
@@ -34,28 +80,19 @@ def fetch_wordpress_products():
     """
     products = []
 
-    with connections['default'].cursor() as cursor:
+    # Cursor sin buffer (SSCursor): las filas se procesan mientras llegan del
+    # servidor, sin materializar antes todo el resultado en el cliente
+    connection = connections['default']
+    connection.ensure_connection()
+
+    with connection.connection.cursor(SSCursor) as cursor:
         cursor.execute("""
             SELECT
                 v.ID,
                 v.sku,
                 v.clean_name AS name,
-
-                CASE
-                    WHEN v.color_raw IS NOT NULL AND TRIM(v.color_raw) != '' THEN
-                        CONCAT(
-                            UPPER(LEFT(REPLACE(v.color_raw, '-', ' '), 1)),
-                            LOWER(SUBSTRING(REPLACE(v.color_raw, '-', ' '), 2))
-                        )
-                    ELSE 'Sin color'
-                END AS color,
-
-                CASE
-                    WHEN v.talla_raw IS NOT NULL AND TRIM(v.talla_raw) != '' THEN
-                        UPPER(SUBSTRING_INDEX(v.talla_raw, '-', -1))
-                    ELSE 'Única'
-                END AS size,
-
+                v.color_raw,
+                v.talla_raw,
                 v.stock_int AS stock,
                 v.stock_loc_294,
                 v.stock_loc_295,
@@ -65,30 +102,27 @@ def fetch_wordpress_products():
             LEFT JOIN wpdt_posts att ON v.thumbnail_id = att.ID
                 AND att.post_type = 'attachment'
             WHERE v.stock_int >= 1
-            ORDER BY v.ID ASC;
+                AND v.clean_name IS NOT NULL
+                AND TRIM(v.clean_name) != '';
         """)
 
-        columns = [col[0] for col in cursor.description]
-        rows = cursor.fetchall()
-
-        for row in rows:
-            row_dict = dict(zip(columns, row))
-
-            name = str(row_dict.get('name', '')).strip()
-            stock = int(row_dict.get('stock', 0))
-
-            if not name or stock <= 0:
-                continue
-
+        # El orden de columnas es fijo en el SELECT: desempaquetado posicional
+        # Color y talla llegan crudos: se normalizan aquí (cacheado por valor)
+        # en vez de con CASE/UPPER/SUBSTRING_INDEX por fila en MariaDB
+        for (pid, sku, name, color_raw, talla_raw, stock,
+             stock_loc_294, stock_loc_295, thumbnail_url) in cursor:
+            # El SQL ya garantiza nombre no vacío, stock >= 1 (INT) y URL no nula
+            name = name.strip()
             product = Product(
-                sku=str(row_dict.get('sku') or row_dict['ID']),
+                sku=sku or str(pid),
                 name=name,
-                color=str(row_dict.get('color', 'Sin color')).strip(),
-                size=str(row_dict.get('size', 'Única')).strip(),
+                color=normalize_color(color_raw),
+                size=normalize_size(talla_raw),
                 stock=stock,
-                thumbnail_url=str(row_dict.get('thumbnail_url', '')).strip(),
-                stock_loc_294=str(row_dict.get('stock_loc_294', '0')).strip(),
-                stock_loc_295=str(row_dict.get('stock_loc_295', '0')).strip(),
+                thumbnail_url=thumbnail_url.strip(),
+                stock_loc_294=str(stock_loc_294).strip(),
+                stock_loc_295=str(stock_loc_295).strip(),
+                category=categorize_product(name),
             )
 
             products.append(product)
@@ -96,16 +130,152 @@ def fetch_wordpress_products():
     return products
 
 
+def _catalog_order(product):
+    """
+    Orden de los productos en el PDF: por color y, a igual color, por SKU.
+    La consulta ya no usa ORDER BY, así el desempate no depende del orden
+    en que MariaDB devuelva las filas
+    """
+    return product.color.lower(), product.sku
+
+
+def _category_cache_key(category):
+    """Clave de cache de los productos de una categoría"""
+    return f"{PRODUCTS_CACHE_KEY}:{quote(category)}"
+
+
+def _store_products(products):
+    """Guarda en cache el catálogo y sus índices derivados"""
+    from .utils import categories
+
+    # Índice (categoría, talla) -> productos ordenados por color, construido
+    # en una sola pasada sobre el catálogo ordenado una sola vez. Cada
+    # categoría se guarda por separado: las vistas de una sola categoría
+    # solo leen (y deserializan) sus propios productos
+    by_category = {}
+    for p in sorted(products, key=_catalog_order):
+        by_category.setdefault(p.category, {}).setdefault(p.size, []).append(p)
+
+    data = {
+        PRODUCTS_CACHE_KEY: products,
+        PRODUCTS_CACHE_TIMESTAMP_KEY: timezone.localtime(),
+        PRODUCTS_CACHE_TOTALS_KEY: _category_totals(products),
+    }
+    for cat, by_size in by_category.items():
+        data[_category_cache_key(cat)] = by_size
+    cache.set_many(data, PRODUCTS_CACHE_TTL)
+
+    # Las categorías que se quedaron sin stock no se sobrescriben: se borran
+    # para que select_size/generate_pdfs no sigan mostrando productos agotados
+    cache.delete_many([
+        _category_cache_key(cat)
+        for cat in [*categories, "Sin categoría"]
+        if cat not in by_category
+    ])
+
+
+# Recarga en segundo plano poco antes de que expire el cache, para que
+# ninguna petición pague la consulta completa. Solo se recarga si el
+# catálogo se usó desde la última carga; si no, se deja expirar
+PRODUCTS_REFRESH_MARGIN = 30  # segundos antes del TTL
+_refresh_lock = threading.Lock()
+_refresh_timer = None
+_products_used = False
+# Se incrementa en cada invalidación: una recarga en curso que empezó antes
+# no debe guardar datos anteriores al "refrescar"
+_cache_generation = 0
+
+
+def _schedule_refresh():
+    """Programa (o reprograma) la única recarga pendiente de este proceso"""
+    global _refresh_timer
+    with _refresh_lock:
+        if _refresh_timer is not None:
+            _refresh_timer.cancel()
+        _refresh_timer = threading.Timer(
+            PRODUCTS_CACHE_TTL - PRODUCTS_REFRESH_MARGIN, _refresh_in_background
+        )
+        _refresh_timer.daemon = True
+        _refresh_timer.start()
+
+
+def _refresh_in_background():
+    """Recarga el catálogo desde la base de datos y reemplaza el cache"""
+    global _products_used
+    if not _products_used:
+        return
+    _products_used = False
+    generation = _cache_generation
+
+    try:
+        products = fetch_wordpress_products()
+        with _refresh_lock:
+            if generation != _cache_generation:
+                # Se invalidó durante la consulta: la próxima petición recarga
+                return
+            _store_products(products)
+    except Exception as e:
+        print(f"Error recargando productos en segundo plano: {str(e)}")
+        return
+    finally:
+        # La conexión de este hilo no la cierra el ciclo de peticiones de Django
+        connections['default'].close()
+
+    _schedule_refresh()
+
+
 def get_cached_products():
     """Obtiene productos con cache de 5 minutos para evitar queries redundantes"""
+    global _products_used
+    _products_used = True
+
     products = cache.get(PRODUCTS_CACHE_KEY)
     if products is None:
         products = fetch_wordpress_products()
-        cache.set(PRODUCTS_CACHE_KEY, products, PRODUCTS_CACHE_TTL)
-        cache.set(PRODUCTS_CACHE_TIMESTAMP_KEY, timezone.localtime(), PRODUCTS_CACHE_TTL)
+        _store_products(products)
+        _schedule_refresh()
     return products
 
 
+def _category_totals(products):
+    """Stock total por categoría (suma de unidades disponibles)"""
+    totals = Counter()
+    for p in products:
+        totals[p.category] += p.stock
+    return totals
+
+
+def get_cached_category_totals():
+    """
+    Obtiene del cache el stock total por categoría, calculado al cargar el
+    catálogo: select_category no necesita deserializar todos los productos
+    """
+    global _products_used
+    _products_used = True
+
+    totals = cache.get(PRODUCTS_CACHE_TOTALS_KEY)
+    if totals is None:
+        totals = _category_totals(get_cached_products())
+    return totals
+
+
+def get_cached_category_sizes(category):
+    """
+    Obtiene del cache los productos de una categoría agrupados por talla
+    ({talla: [productos ordenados por color]})
+    """
+    global _products_used
+    _products_used = True
+
+    by_size = cache.get(_category_cache_key(category))
+    if by_size is None:
+        by_size = {}
+        category_products = [p for p in get_cached_products() if p.category == category]
+        for p in sorted(category_products, key=_catalog_order):
+            by_size.setdefault(p.size, []).append(p)
+    return by_size
+
+
 def _get_cache_timestamp():
     """Retorna el timestamp de la última carga de datos"""
     return cache.get(PRODUCTS_CACHE_TIMESTAMP_KEY)
@@ -113,21 +283,184 @@ def _get_cache_timestamp():
 
 def _invalidate_cache():
     """Invalida el cache de productos para forzar recarga"""
-    cache.delete(PRODUCTS_CACHE_KEY)
-    cache.delete(PRODUCTS_CACHE_TIMESTAMP_KEY)
+    global _cache_generation
+    from .utils import categories
+
+    category_keys = [_category_cache_key(cat) for cat in [*categories, "Sin categoría"]]
+    with _refresh_lock:
+        _cache_generation += 1
+        cache.delete_many([
+            PRODUCTS_CACHE_KEY, PRODUCTS_CACHE_TIMESTAMP_KEY, PRODUCTS_CACHE_TOTALS_KEY,
+            *category_keys,
+        ])
+
+
+IMAGE_DOWNLOAD_WORKERS = IMAGE_POOL_SIZE
+
+# Cache en disco de miniaturas ya reducidas y codificadas, por hash de URL.
+# Una misma URL puede cambiar de contenido (p. ej. "regenerar miniaturas" de
+# WordPress reescribe los -1070x1536 en su sitio), por eso cada miniatura
+# caduca IMAGE_CACHE_MAX_AGE después de creada (mtime). El uso se marca en
+# atime para el LRU, así los aciertos no alargan la caducidad
+IMAGE_CACHE_DIR = os.path.join(PDF_TEMP_DIR, 'img')
+IMAGE_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 200 MB
+IMAGE_CACHE_MAX_AGE = 24 * 60 * 60  # 24 horas
+IMAGE_CACHE_TMP_MAX_AGE = 60  # .tmp más antiguos: escritura interrumpida
+os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+
+
+# Ancho máximo embebido: 2x el ancho de dibujo (2.0 inch a 72 dpi = 144 px)
+IMAGE_MAX_WIDTH = int(2.0 * inch * 2)
+IMAGE_JPEG_QUALITY = 75
+
+
+def _encode_thumbnail(img):
+    """
+    Reduce la imagen a la resolución de dibujo del PDF y la codifica a JPEG.
+    Retorna (bytes JPEG, (ancho, alto))
+    """
+    if img.width > IMAGE_MAX_WIDTH:
+        new_height = max(1, round(img.height * IMAGE_MAX_WIDTH / img.width))
+        if img.format == 'JPEG':
+            # Decodificar el JPEG ya reducido (escalado DCT 1/2, 1/4, 1/8):
+            # menos píxeles que decodificar y que pasar por LANCZOS
+            img.draft(None, (IMAGE_MAX_WIDTH, new_height))
+        # resize() devuelve una imagen nueva: no altera la imagen por defecto compartida
+        img = img.resize((IMAGE_MAX_WIDTH, new_height), Image.LANCZOS)
+
+    img_buffer = BytesIO()
+    img.save(img_buffer, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    return img_buffer.getvalue(), img.size
+
+
+@lru_cache(maxsize=1)
+def _default_thumbnail():
+    """La imagen por defecto se codifica una sola vez por proceso"""
+    return _encode_thumbnail(DEFAULT_IMAGE)
+
+
+def _image_cache_path(url):
+    """
+    Ruta en el cache de disco para la miniatura de una URL. La clave incluye
+    los parámetros de codificación: al cambiarlos no se reusan miniaturas viejas
+    """
+    key = f"{IMAGE_MAX_WIDTH}:{IMAGE_JPEG_QUALITY}:{url}"
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return os.path.join(IMAGE_CACHE_DIR, f"{digest}.jpg")
+
+
+def _load_image(url):
+    """
+    Obtiene la miniatura de una URL: del cache en disco si existe, si no la
+    descarga, la codifica y la guarda. Retorna (bytes JPEG, aspecto alto/ancho)
+    """
+    cache_path = _image_cache_path(url)
+    try:
+        created = os.stat(cache_path).st_mtime
+        if time.time() - created < IMAGE_CACHE_MAX_AGE:
+            with open(cache_path, 'rb') as f:
+                jpeg_bytes = f.read()
+            img_width, img_height = Image.open(BytesIO(jpeg_bytes)).size
+            # Marcar como usada (atime, LRU) conservando la fecha de creación
+            os.utime(cache_path, (time.time(), created))
+            return jpeg_bytes, img_height / float(img_width)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Miniatura en cache inválida para {url}: {str(e)}")
+
+    img = download_image(url, session=SESSION)
+    if img is DEFAULT_IMAGE:
+        # Las descargas fallidas no se guardan: se reintentan la próxima vez
+        jpeg_bytes, (img_width, img_height) = _default_thumbnail()
+        return jpeg_bytes, img_height / float(img_width)
+
+    jpeg_bytes, (img_width, img_height) = _encode_thumbnail(img)
+    _store_thumbnail(cache_path, jpeg_bytes)
+
+    return jpeg_bytes, img_height / float(img_width)
+
+
+def _store_thumbnail(cache_path, jpeg_bytes):
+    """
+    Guarda una miniatura en el cache de disco. Es best-effort: si falla, la
+    imagen ya codificada se usa igual y solo se pierde el cache
+    """
+    # Escritura atómica: otro hilo/proceso nunca lee un archivo a medias
+    tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        # El directorio pudo ser borrado por una limpieza de /tmp
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(jpeg_bytes)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"No se pudo guardar la miniatura en cache {cache_path}: {str(e)}")
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def _prune_image_cache():
+    """
+    Elimina miniaturas caducadas y temporales huérfanos, y las usadas hace
+    más tiempo si el cache supera el límite
+    """
+    now = time.time()
+    entries = []
+    total = 0
+    try:
+        with os.scandir(IMAGE_CACHE_DIR) as it:
+            for entry in it:
+                # Otra petición puede borrar el archivo entre scandir y stat
+                try:
+                    stat = entry.stat()
+                    if entry.name.endswith('.tmp'):
+                        if now - stat.st_mtime > IMAGE_CACHE_TMP_MAX_AGE:
+                            os.remove(entry.path)
+                    elif entry.name.endswith('.jpg'):
+                        if now - stat.st_mtime >= IMAGE_CACHE_MAX_AGE:
+                            os.remove(entry.path)
+                        else:
+                            entries.append((stat.st_atime, stat.st_size, entry.path))
+                            total += stat.st_size
+                except FileNotFoundError:
+                    continue
+    except FileNotFoundError:
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        return
+
+    if total <= IMAGE_CACHE_MAX_BYTES:
+        return
+
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= IMAGE_CACHE_MAX_BYTES * 0.8:
+            break
 
 
 def _prefetch_images(products):
-    """Pre-descarga imágenes en paralelo usando ThreadPoolExecutor"""
-    unique_urls = list({p.thumbnail_url for p in products if p.thumbnail_url})
+    """Pre-descarga y codifica imágenes en paralelo usando ThreadPoolExecutor"""
+    # Incluye URLs vacías para que el dibujo nunca tenga que descargar en serie
+    unique_urls = list({p.thumbnail_url for p in products})
     image_map = {}
 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_url = {executor.submit(download_image, url): url for url in unique_urls}
+    with ThreadPoolExecutor(max_workers=IMAGE_DOWNLOAD_WORKERS) as executor:
+        future_to_url = {executor.submit(_load_image, url): url for url in unique_urls}
         for future in as_completed(future_to_url):
             url = future_to_url[future]
-            image_map[url] = future.result()
+            try:
+                image_map[url] = future.result()
+            except Exception as e:
+                print(f"Error procesando imagen {url}: {str(e)}")
 
+    _prune_image_cache()
     return image_map
 
 
@@ -136,15 +469,8 @@ def select_category(request):
     """Muestra las categorías disponibles basadas en productos en stock"""
     from .utils import categories
 
-    products = get_cached_products()
-
-    # Stock total por categoría (suma de unidades disponibles)
-    category_counts = {}
-    for p in products:
-        cat = categorize_product(p.name)
-        if cat == "Sin categoría" or cat not in categories:
-            continue
-        category_counts[cat] = category_counts.get(cat, 0) + p.stock
+    # Stock total por categoría (precalculado al cargar el cache)
+    category_counts = get_cached_category_totals()
 
     available_categories = [
         (cat, category_counts[cat])
@@ -180,13 +506,13 @@ def _sort_sizes(sizes):
 @login_required
 def select_size(request, category):
     decoded_category = unquote(category)
-    products = get_cached_products()
-    category_products = [p for p in products if categorize_product(p.name) == decoded_category]
+    products_by_size = get_cached_category_sizes(decoded_category)
 
     # Stock total por talla (suma de unidades disponibles)
-    size_counts = {}
-    for p in category_products:
-        size_counts[p.size] = size_counts.get(p.size, 0) + p.stock
+    size_counts = {
+        size: sum(p.stock for p in size_products)
+        for size, size_products in products_by_size.items()
+    }
 
     sorted_sizes = _sort_sizes(size_counts.keys())
     sizes = [(s, size_counts[s]) for s in sorted_sizes]
@@ -215,78 +541,127 @@ def generate_pdfs(request, category, sizes):
     decoded_category = unquote(category)
     sizes = sizes.split(",")
 
-    # Obtener productos UNA sola vez para todas las tallas
-    all_products = get_cached_products()
-
-    # Pre-filtrar y ordenar productos por talla
-    products_by_size = {}
-    for size in sizes:
-        products_by_size[size] = sorted(
-            [p for p in all_products if p.size == size and categorize_product(p.name) == decoded_category],
-            key=lambda p: p.color.lower()
-        )
+    # Índice por talla (ya ordenado por color) leído UNA vez para todas las tallas
+    category_sizes = get_cached_category_sizes(decoded_category)
+    products_by_size = {size: category_sizes.get(size, []) for size in sizes}
 
     # Pre-descargar TODAS las imágenes de todas las tallas en paralelo
     all_filtered = [p for prods in products_by_size.values() for p in prods]
     image_map = _prefetch_images(all_filtered)
 
-    response_data = []
-
-    for size in sizes:
+    if len(sizes) == 1:
+        size = sizes[0]
         try:
-            pdf_content = generate_pdf_content(products_by_size[size], image_map)
-            if pdf_content:
-                filename = f"{decoded_category}_{size}.pdf"
-                if len(sizes) == 1:
-                    response = HttpResponse(pdf_content, content_type='application/pdf')
-                    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-                    return response
-
-                # Guardar PDF en archivo temporal en lugar de sesión hex
-                pdf_id = str(uuid.uuid4())
-                pdf_path = os.path.join(PDF_TEMP_DIR, f"{pdf_id}.pdf")
-                with open(pdf_path, 'wb') as f:
-                    f.write(pdf_content)
-
-                pdf_key = f'pdf_{category}_{size}'
-                request.session[pdf_key] = pdf_id
-                response_data.append({
-                    'url': f'/download_pdf/{category}/{size}/',
-                    'filename': filename
-                })
-
+            # ReportLab escribe directamente en la respuesta, sin buffer intermedio
+            response = HttpResponse(content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="{decoded_category}_{size}.pdf"'
+            generate_pdf_content(products_by_size[size], image_map, response)
+            return response
         except Exception as e:
             return JsonResponse({
                 'error': f"Error generating PDF for size {size}: {str(e)}"
             }, status=500)
 
+    # Cada talla se escribe directamente en un archivo temporal; el id viaja
+    # firmado en la URL de descarga, sin escribir en la sesión
+    _purge_expired_pdfs()
+    # El token se firma ANTES de generar: su fecha nunca es posterior al mtime
+    # del archivo, así _purge_expired_pdfs no borra un PDF con enlace vigente
+    jobs = []
+    for size in sizes:
+        pdf_id = str(uuid.uuid4())
+        jobs.append((size, pdf_id, _pdf_signer.sign(pdf_id)))
+    generated_at = timezone.localtime().strftime("%d/%m/%Y (%H:%M)")
+
+    failed_size = None
+    try:
+        # Se generan en este proceso: con las imágenes ya codificadas el dibujo
+        # de cada talla es corto y arrancar procesos aparte cuesta más
+        for size, pdf_id, _ in jobs:
+            failed_size = size
+            _write_pdf_file(products_by_size[size], image_map, _pdf_temp_path(pdf_id), generated_at)
+
+    except Exception as e:
+        for _, pdf_id, _ in jobs:
+            pdf_path = _pdf_temp_path(pdf_id)
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+        return JsonResponse({
+            'error': f"Error generating PDF for size {failed_size}: {str(e)}"
+        }, status=500)
+
+    response_data = []
+    for size, _, token in jobs:
+        response_data.append({
+            'url': f'/download_pdf/{category}/{size}/?{urlencode({"token": token})}',
+            'filename': f"{decoded_category}_{size}.pdf"
+        })
+
     return JsonResponse({'files': response_data})
 
 
 @login_required
 def download_pdf(request, category, size):
-    pdf_key = f'pdf_{category}_{size}'
-    pdf_id = request.session.get(pdf_key)
+    try:
+        pdf_id = _pdf_signer.unsign(request.GET.get('token', ''), max_age=PDF_LINK_MAX_AGE)
+    except BadSignature:
+        pdf_id = None
 
     if pdf_id:
-        pdf_path = os.path.join(PDF_TEMP_DIR, f"{pdf_id}.pdf")
-        if os.path.exists(pdf_path):
-            filename = f"{unquote(category)}_{size}.pdf"
-            with open(pdf_path, 'rb') as f:
-                pdf_bytes = f.read()
+        pdf_path = _pdf_temp_path(pdf_id)
+        try:
+            pdf_file = open(pdf_path, 'rb')
+        except FileNotFoundError:
+            pdf_file = None
+
+        if pdf_file is not None:
+            # El descriptor abierto sigue siendo válido tras borrar el archivo,
+            # así se transmite por bloques sin cargar todo el PDF en memoria
             os.remove(pdf_path)
-            del request.session[pdf_key]
-            response = HttpResponse(pdf_bytes, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+            filename = f"{unquote(category)}_{size}.pdf"
+            return FileResponse(
+                pdf_file,
+                as_attachment=True,
+                filename=filename,
+                content_type='application/pdf',
+            )
 
     return HttpResponse('PDF not found', status=404)
 
 
-def generate_pdf_content(products, image_map):
-    """Genera el contenido del PDF para una lista de productos"""
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
+# Medidas de diseño del PDF (constantes, se calculan una sola vez)
+DEFAULT_DISPLAY_HEIGHT = 2.0 * inch
+TEXT_X_OFFSET = 2.35 * inch
+NAME_WRAP_WIDTH = 15
+PRODUCTS_PER_PAGE = 6
+
+
+@lru_cache(maxsize=4096)
+def _wrap_name(name):
+    """Nombre a mostrar (antes del primer '-') partido en líneas; cacheado por nombre"""
+    product_name = name.split('-')[0].strip()
+    if len(product_name) <= NAME_WRAP_WIDTH:
+        return (product_name,) if product_name else ()
+    return tuple(textwrap.wrap(product_name, width=NAME_WRAP_WIDTH))
+
+
+def _write_pdf_file(products, image_map, pdf_path, generated_at):
+    """Genera el PDF de una talla en `pdf_path`; si falla no deja el archivo a medias"""
+    try:
+        with open(pdf_path, 'wb') as f:
+            generate_pdf_content(products, image_map, f, generated_at)
+    except Exception:
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+        raise
+
+
+def generate_pdf_content(products, image_map, output, generated_at=None):
+    """
+    Genera el PDF para una lista de productos y lo escribe en `output`
+    (cualquier objeto con write(): archivo, HttpResponse...)
+    """
+    c = canvas.Canvas(output, pagesize=letter)
     c.setPageCompression(1)
     c.setTitle("Catálogo DUDS")
 
@@ -297,118 +672,120 @@ def generate_pdf_content(products, image_map):
     space_between_columns = 4 * inch
     image_display_width = 2.0 * inch
 
-    current_datetime = timezone.localtime().strftime("%d/%m/%Y (%H:%M)")
-    c.setFont("Helvetica", 10)
-    c.drawString(width - 130, height - 20, current_datetime)
+    current_datetime = generated_at or timezone.localtime().strftime("%d/%m/%Y (%H:%M)")
 
-    def add_product_to_page(product, x, y):
-        display_height = 2.0 * inch
-        img_reader = None
+    # Un ImageReader por URL dentro de este documento
+    readers = {}
 
-        try:
-            img = image_map.get(product.thumbnail_url)
-            if img is None:
-                img = download_image(product.thumbnail_url)
-
-            img_width, img_height = img.size
-            aspect = img_height / float(img_width)
-            display_height = image_display_width * aspect
+    def start_page():
+        # ReportLab reinicia el estado gráfico en cada showPage()
+        c.setStrokeColor(black)
+        c.setFont("Helvetica", 10)
+        c.drawString(width - 130, height - 20, current_datetime)
 
-            # Usar BytesIO en lugar de archivo temporal
-            img_buffer = BytesIO()
-            img.save(img_buffer, "JPEG", quality=85)
-            img_buffer.seek(0)
-            img_reader = ImageReader(img_buffer)
+    def image_for(product):
+        """Retorna (ImageReader o None, alto de dibujo) de un producto"""
+        try:
+            # JPEG y aspecto ya calculados en _prefetch_images (una vez por URL)
+            jpeg_bytes, aspect = image_map[product.thumbnail_url]
+            img_reader = readers.get(product.thumbnail_url)
+            if img_reader is None:
+                img_reader = ImageReader(BytesIO(jpeg_bytes))
+                readers[product.thumbnail_url] = img_reader
+            return img_reader, image_display_width * aspect
 
         except Exception as e:
             print(f"Error procesando imagen para producto {product.sku}: {str(e)}")
-            img_reader = None
-
-        # Fondo negro
+            return None, DEFAULT_DISPLAY_HEIGHT
+
+    def draw_page(page_products):
+        """
+        Dibuja los productos de una página por fases (fondos, imágenes,
+        marcos y texto agrupado por fuente): cada fuente/color se fija una
+        vez por página en lugar de una vez por producto
+        """
+        slots = []
+        for page_position, product in enumerate(page_products):
+            row = page_position // 2
+            col = page_position % 2
+
+            x = 0.5 * inch + col * space_between_columns
+            y = height - (0.5 * inch + row * space_between_rows)
+
+            img_reader, display_height = image_for(product)
+            slots.append((product, x, y, img_reader, display_height))
+
+        # Fondos negros
         c.setFillColor(black)
-        c.rect(x - 3, y - display_height - 5, image_display_width, display_height, fill=1)
-
-        if img_reader:
-            try:
-                c.drawImage(
-                    img_reader,
-                    x + 2, y - display_height,
-                    width=image_display_width,
-                    height=display_height
-                )
-            except Exception as e:
-                print(f"Error dibujando imagen para producto {product.sku}: {str(e)}")
-                _draw_image_error(c, x, y, display_height, image_display_width)
-        else:
+        for product, x, y, img_reader, display_height in slots:
+            c.rect(x - 3, y - display_height - 5, image_display_width, display_height, fill=1)
+
+        # Imágenes
+        for product, x, y, img_reader, display_height in slots:
+            if img_reader:
+                try:
+                    c.drawImage(
+                        img_reader,
+                        x + 2, y - display_height,
+                        width=image_display_width,
+                        height=display_height
+                    )
+                    continue
+                except Exception as e:
+                    print(f"Error dibujando imagen para producto {product.sku}: {str(e)}")
             _draw_image_error(c, x, y, display_height, image_display_width)
 
-        # Marco
-        c.setStrokeColor(black)
-        c.rect(x + 2, y - display_height, image_display_width, display_height, fill=0)
+        # Marcos
+        for product, x, y, img_reader, display_height in slots:
+            c.rect(x + 2, y - display_height, image_display_width, display_height, fill=0)
 
         # --- BLOQUE DE TEXTO ---
-        product_name = product.name.split('-')[0].strip()
-        wrapped_lines = textwrap.wrap(product_name, width=15)
-
-        text_x = x + 2.35 * inch
-        text_y = y - 50
-
-        # Nombre
-        c.setFont("Helvetica", 12)
         c.setFillColor(black)
-        for line in wrapped_lines:
-            c.drawString(text_x, text_y, line)
-            text_y -= 14
-
-        text_y -= 6
+        texts = []
+        for product, x, y, img_reader, display_height in slots:
+            wrapped_lines = _wrap_name(product.name)
+            name_y = y - 50
+            sku_y = name_y - 14 * len(wrapped_lines) - 6
+            color_y = sku_y - 14
+            y_stock_total = y - 168
+            texts.append((
+                product, x + TEXT_X_OFFSET, wrapped_lines,
+                name_y, sku_y, color_y, color_y - 18,
+                y_stock_total, y_stock_total - 14, y_stock_total - 26,
+            ))
+
+        # Nombre, color y stock disponible
+        c.setFont("Helvetica", 12)
+        for product, text_x, wrapped_lines, name_y, _, color_y, _, y_stock_total, _, _ in texts:
+            for line_index, line in enumerate(wrapped_lines):
+                c.drawString(text_x, name_y - 14 * line_index, line)
+            c.drawString(text_x, color_y, f"Color: {product.color}")
+            c.drawString(text_x, y_stock_total, f"Disponible: {product.stock}")
 
-        # SKU
+        # SKU y stock por ubicación
         c.setFont("Helvetica", 10)
-        c.drawString(text_x, text_y, f"SKU: {product.sku}")
-        text_y -= 14
-
-        # Color
-        c.setFont("Helvetica", 12)
-        c.drawString(text_x, text_y, f"Color: {product.color}")
-        text_y -= 18
+        for product, text_x, _, _, sku_y, _, _, _, y_loc_294, y_loc_295 in texts:
+            c.drawString(text_x, sku_y, f"SKU: {product.sku}")
+            c.drawString(text_x, y_loc_294, f"Cablec: {product.stock_loc_294}")
+            c.drawString(text_x, y_loc_295, f"Bodega: {product.stock_loc_295}")
 
         # Talla
         c.setFont("Helvetica-Bold", 15)
-        c.drawString(text_x, text_y, f"{product.size}")
+        for product, text_x, _, _, _, _, size_y, _, _, _ in texts:
+            c.drawString(text_x, size_y, f"{product.size}")
 
-        # Stock
-        y_stock_total = y - 168
+    pages = [
+        products[i:i + PRODUCTS_PER_PAGE]
+        for i in range(0, len(products), PRODUCTS_PER_PAGE)
+    ] or [[]]
 
-        c.setFont("Helvetica", 12)
-        c.drawString(text_x, y_stock_total, f"Disponible: {product.stock}")
-
-        y_loc_294 = y_stock_total - 14
-        c.setFont("Helvetica", 10)
-        c.drawString(text_x, y_loc_294, f"Cablec: {product.stock_loc_294}")
-
-        y_loc_295 = y_loc_294 - 12
-        c.drawString(text_x, y_loc_295, f"Bodega: {product.stock_loc_295}")
-
-    for i, product in enumerate(products):
-        page_position = i % 6
-        if page_position == 0 and i != 0:
+    for page_number, page_products in enumerate(pages):
+        if page_number:
             c.showPage()
-            c.setFont("Helvetica", 10)
-            c.drawString(width - 130, height - 20, current_datetime)
-
-        row = page_position // 2
-        col = page_position % 2
-
-        x = 0.5 * inch + col * space_between_columns
-        y = height - (0.5 * inch + row * space_between_rows)
-
-        add_product_to_page(product, x, y)
+        start_page()
+        draw_page(page_products)
 
     c.save()
-    buffer.seek(0)
-    pdf_content = buffer.getvalue()
-    buffer.close()
-    return pdf_content
 
 
 def _draw_image_error(c, x, y, display_height, image_display_width):